@@ -1,9 +1,9 @@
 __copyright__ = "Copyright (c) 2021 Heewon Jeon"
 
 import os
-import json
 
 import click
+import orjson
 from jina import Flow, Document
 
 
@@ -26,13 +26,15 @@ def print_topk(resp, sentence):
         print('\n\n\n')
 
 
-def _pre_processing(texts):
+def _pre_processing(data_path):
     print('start of pre-processing')
-    results = []
-    for i in texts:
-        d = json.loads(i)
-        results.append(Document(json.dumps(d, ensure_ascii=False)))
-    return results
+    with open(data_path, 'rb') as fp:
+        for d in map(orjson.loads, fp):
+            text = d['title'].strip() + '. ' + d['question']
+            if 'id' in d:
+                yield Document(id=d.pop('id'), text=text, tags=d)
+            else:
+                yield Document(text=text, tags=d)
 
 
 def index():
@@ -44,7 +46,7 @@ def index():
         data_path = os.path.join(os.path.dirname(__file__),
                                  os.environ.get('JINA_DATA_FILE', None))
         f.post('/index',
-               _pre_processing(open(data_path, 'rt').readlines()),
+               _pre_processing(data_path),
                show_progress=True,
                parameters={'traversal_paths': ['r', 'c']})
         f.post('/dump',
@@ -100,7 +102,7 @@ def train():
         data_path = os.path.join(os.path.dirname(__file__),
                                  os.environ.get('JINA_DATA_FILE', None))
         f.post('/train',
-               _pre_processing(open(data_path, 'rt').readlines()),
+               _pre_processing(data_path),
                show_progress=True,
                parameters={'traversal_paths': ['r', 'c']},
                request_size=0)
@@ -21,9 +21,11 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
 # OR OTHER DEALINGS IN THE SOFTWARE.
 
+import os
 import re
 from typing import Dict, List, Optional, Tuple
 
+import hnswlib
 import numpy as np
 from jina import Document, DocumentArray, Executor, requests
 from jina.logging.logger import JinaLogger
@@ -34,6 +36,27 @@ from jinahub.indexers.searcher.AnnoySearcher import AnnoySearcher
 from jinahub.indexers.searcher.HnswlibSearcher import HnswlibSearcher
 from jinahub.indexers.searcher.FaissSearcher import FaissSearcher
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+# the characters Python's re matches with \s, spelled out since re2's \s
+# only covers ASCII whitespace
+_WHITESPACE = ('\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a'
+               '\u2028\u2029\u202f\u205f\u3000')
+
 
 class Preprocess(Executor):
     def __init__(self, default_traversal_path, *args, **kwargs):
@@ -74,17 +97,21 @@ class Segmenter(Executor):
             self.logger.warning(
                 'the min_sent_len (={}) should be smaller or equal to the max_sent_len (={})'
                 .format(self.min_sent_len, self.max_sent_len))
-        self._slit_pat = re.compile('\s*([^{0}]+)(?<!\s)[{0}]*'.format(''.join(
-            set(self.punct_chars))))
+        # no lookbehind and no \s, so re2 compiles it to a DFA and splits
+        # exactly like re
+        self._slit_pat = (re2 or re).compile(
+            '[{1}]*([^{0}]*[^{0}{1}])[{0}]*'.format(
+                ''.join(set(self.punct_chars)), _WHITESPACE))
+        self._newline_pat = re.compile('\n+')
 
     def _split(self, text: str) -> List:
         results = []
         ret = [(m.group(0), m.start(), m.end())
-               for m in re.finditer(self._slit_pat, text)]
+               for m in self._slit_pat.finditer(text)]
         if not ret:
             ret = [(text, 0, len(text))]
         for ci, (r, s, e) in enumerate(ret):
-            f = re.sub('\n+', ' ', r).strip()
+            f = self._newline_pat.sub(' ', r).strip()
             f = f[:self.max_sent_len]
             if len(f) > self.min_sent_len:
                 results.append(
@@ -107,15 +134,69 @@ class Segmenter(Executor):
 
 
 class DocVectorIndexer(Executor):
-    def __init__(self, index_file_name: str, aggr_chunks: str, **kwargs):
+    def __init__(self,
+                 index_file_name: str,
+                 aggr_chunks: str,
+                 ann: bool = False,
+                 quantize: bool = False,
+                 kernel: str = 'simsimd',
+                 buffer_k: int = 5,
+                 ef_construction: int = 400,
+                 ef_query: int = 50,
+                 max_connection: int = 16,
+                 **kwargs):
         super().__init__(**kwargs)
         self.aggr_chunks = aggr_chunks.lower()
+        self.ann = ann
+        self.quantize = quantize
+        self.logger = JinaLogger(self.__class__.__name__)
+        # distance kernel for the brute-force scan
+        self.kernel = kernel.lower()
+        if self.kernel not in _KERNELS:
+            raise ValueError(f'kernel must be one of {list(_KERNELS)}')
+        if not _KERNELS[self.kernel]:
+            self.logger.warning(
+                f'{self.kernel} is not installed, falling back to numpy.')
+            self.kernel = 'numpy'
+        if self.quantize and self.kernel != 'simsimd':
+            # an int8 scan without simsimd moves more bytes than fp32
+            self.logger.warning(
+                'quantize needs the simsimd kernel, scanning in fp32.')
+            self.quantize = False
+        self.buffer_k = buffer_k
+        self.ef_construction = ef_construction
+        self.ef_query = ef_query
+        self.max_connection = max_connection
         self._docs = DocumentArrayMemmap(self.workspace +
                                          f'/{index_file_name}')
+        self._emb_path = self.workspace + f'/{index_file_name}.f32'
+        self._ids_path = self.workspace + f'/{index_file_name}.ids'
+        self._counts_path = self.workspace + f'/{index_file_name}.counts'
+        self._weights_path = self.workspace + f'/{index_file_name}.weights'
+        self._row_paths = [
+            self._emb_path, self._ids_path, self._counts_path,
+            self._weights_path
+        ]
+        self._n_saved = None
+        self._ann_path = self.workspace + f'/{index_file_name}.hnsw'
+        self._ann = None
+        self._index_matrix = None
+        self._dirty = True
 
     @requests(on='/index')
     def index(self, docs: DocumentArray, **kwargs):
+        if self._n_saved is None:
+            self._n_saved = self._get_n_saved()
+        in_sync = self._n_saved == len(self._docs)
         self._docs.extend(docs)
+        # a known id is overwritten in place, so only a request that grew
+        # the memmap by one doc per input can be appended to the side files
+        if in_sync and len(self._docs) == self._n_saved + len(docs):
+            self._save_rows(docs, append=True)
+        else:
+            self._save_rows(self._docs, append=False)
+        self._n_saved = len(self._docs)
+        self._dirty = True
 
     @requests(on='/delete')
     def delete(self, docs: DocumentArray, **kwargs):
@@ -124,6 +205,7 @@ class DocVectorIndexer(Executor):
         for doc in docs:
             if doc.id in self._docs:
                 del self._docs[doc.id]
+        self._invalidate()
     
     @requests(on='/update')
     def update(self, docs: DocumentArray, **kwargs):
@@ -134,57 +216,224 @@ class DocVectorIndexer(Executor):
                 self._docs[doc.id] = doc
             else:
                 self._docs.append(doc)
+        self._invalidate()
+
+    def _invalidate(self):
+        # rows changed in place, rewrite the row files from the memmap
+        # and drop the ANN graph built from the old ones
+        for path in [self._ann_path, self._ann_path + '.sig']:
+            if os.path.exists(path):
+                os.remove(path)
+        self._save_rows(self._docs, append=False)
+        self._n_saved = len(self._docs)
+        self._dirty = True
+
+    def _get_rows(self, docs) -> Tuple[List, List, List, List]:
+        # one count per doc, docs without chunks keep a count of 0
+        doc_ids, embeds, weights, counts = [], [], [], []
+        for d in docs:
+            doc_ids.append(d.id)
+            if self.aggr_chunks == 'none':
+                b = np.expand_dims(d.embedding, 0)
+            elif len(d.chunks) > 0:
+                b = d.chunks.embeddings
+                weights.extend(d.chunks.get_attributes('weight'))
+            else:
+                counts.append(0)
+                continue
+            embeds.append(b)
+            counts.append(b.shape[0])
+        return doc_ids, embeds, weights, counts
+
+    def _get_n_saved(self) -> int:
+        if not all(os.path.exists(p) for p in self._row_paths):
+            return -1
+        return os.path.getsize(self._counts_path) // 8
+
+    def _save_rows(self, docs, append: bool):
+        # normalized float32 rows and their layout go to flat side files,
+        # appended per /index request
+        doc_ids, embeds, weights, counts = self._get_rows(docs)
+        data = [
+            _norm(np.concatenate(embeds).astype(np.float32, copy=False)
+                  ).tobytes() if embeds else b'',
+            ''.join(f'{_id}\n' for _id in doc_ids).encode('utf-8'),
+            np.array(counts, dtype=np.int64).tobytes(),
+            np.array(weights, dtype=np.float32).tobytes()
+        ]
+        for path, b in zip(self._row_paths, data):
+            if append:
+                with open(path, 'ab') as fp:
+                    fp.write(b)
+            else:
+                # a rewrite goes through a new file, the old one may be mapped
+                with open(path + f'.{os.getpid()}.tmp', 'wb') as fp:
+                    fp.write(b)
+                os.replace(path + f'.{os.getpid()}.tmp', path)
+
+    def _load_rows(self) -> Optional[Dict]:
+        if self._get_n_saved() != len(self._docs):
+            return None
+        counts = np.fromfile(self._counts_path, dtype=np.int64)
+        weights = np.fromfile(self._weights_path, dtype=np.float32)
+        with open(self._ids_path, 'rt', encoding='utf-8') as fp:
+            doc_ids = np.array(fp.read().split('\n')[:-1])
+        n_rows = int(counts.sum())
+        emb_size = os.path.getsize(self._emb_path)
+        if (len(doc_ids) != len(counts) or n_rows == 0
+                or emb_size % (4 * n_rows)
+                or (self.aggr_chunks != 'none' and len(weights) != n_rows)):
+            return None
+        st = os.stat(self._emb_path)
+        return dict(doc_ids=doc_ids,
+                    counts=counts,
+                    weights=weights,
+                    signature=f'{st.st_ino}:{st.st_mtime_ns}:{st.st_size}',
+                    matrix=np.memmap(self._emb_path,
+                                     dtype=np.float32,
+                                     mode='r',
+                                     shape=(n_rows,
+                                            emb_size // (4 * n_rows))))
+
+    def _build_index_matrix(self):
+        # map the row files once, remapped only after the index changes
+        rows = self._load_rows()
+        if rows is None:
+            # row files missing or behind the memmap (e.g. an older
+            # workspace), build in memory and leave the workspace untouched
+            doc_ids, embeds, weights, counts = self._get_rows(self._docs)
+            rows = dict(
+                doc_ids=np.array(doc_ids),
+                counts=np.array(counts, dtype=np.int64),
+                weights=np.array(weights, dtype=np.float32),
+                matrix=_norm(
+                    np.concatenate(embeds).astype(np.float32, copy=False))
+                if embeds else None,
+                signature=None)
+        has_rows = rows['counts'] > 0
+        self._doc_ids = rows['doc_ids'][has_rows]
+        self._chunk_weights = rows['weights']
+        self._chunk_counts = rows['counts'][has_rows]
+        self._chunk_offsets = np.cumsum(
+            self._chunk_counts) - self._chunk_counts
+        self._row_doc = np.repeat(np.arange(len(self._doc_ids)),
+                                  self._chunk_counts)
+        self._index_matrix = rows['matrix']
+        if self.quantize and self._index_matrix is not None:
+            self._index_q, self._index_scale = _quantize(self._index_matrix)
+        self._ann = None
+        if self.ann and self._index_matrix is not None:
+            self._ann = self._build_ann(rows['signature'])
+        self._dirty = False
+
+    def _build_ann(self, signature: Optional[str]):
+        # a saved graph is reused only if it was built from the same .f32
+        # file, an in-memory matrix is never persisted
+        n_rows, dim = self._index_matrix.shape
+        ann = hnswlib.Index(space='cosine', dim=dim)
+        sig_path = self._ann_path + '.sig'
+        if signature is not None and os.path.exists(
+                self._ann_path) and os.path.exists(sig_path):
+            with open(sig_path, 'rt') as fp:
+                if fp.read() == signature:
+                    ann.load_index(self._ann_path, max_elements=n_rows)
+                    return ann
+        ann.init_index(max_elements=n_rows,
+                       ef_construction=self.ef_construction,
+                       M=self.max_connection)
+        ann.add_items(self._index_matrix, np.arange(n_rows))
+        if signature is not None:
+            # graph first, a reader racing this sees a mismatching signature
+            tmp_path = f'{self._ann_path}.{os.getpid()}.tmp'
+            ann.save_index(tmp_path)
+            os.replace(tmp_path, self._ann_path)
+            with open(tmp_path, 'wt') as fp:
+                fp.write(signature)
+            os.replace(tmp_path, sig_path)
+        return ann
+
+    def _get_ann_top_k(self, q_emb: 'np.ndarray', top_k: int) -> Tuple[
+            List['np.ndarray'], List['np.ndarray']]:
+        k = min(int(top_k * self.buffer_k), self._index_matrix.shape[0])
+        self._ann.set_ef(max(self.ef_query, k))
+        labels, dists = self._ann.knn_query(q_emb, k=k)
+        if self.aggr_chunks != 'none':
+            dists = dists * self._chunk_weights[labels]  # cosine distance
+        idx, dist = [], []
+        for _labels, _dists in zip(labels, dists):
+            # keep the closest retrieved chunk of each document
+            order = np.argsort(_dists, kind='stable')
+            doc_idx, _dists = self._row_doc[_labels[order]], _dists[order]
+            _, first = np.unique(doc_idx, return_index=True)
+            first = np.sort(first)[:top_k]
+            idx.append(doc_idx[first])
+            dist.append(_dists[first])
+        return idx, dist
+
+    def _get_quantized_cosine(self, q_emb: 'np.ndarray',
+                              top_k: int) -> 'np.ndarray':
+        q_q, q_scale = _quantize(q_emb)
+        dists = (1 - _dot_int8(q_q, self._index_q) * q_scale *
+                 self._index_scale.T).clip(min=0)
+        # re-score the best candidate rows in fp32
+        k = min(int(top_k * self.buffer_k), dists.shape[1])
+        cands = dists.argpartition(kth=k - 1, axis=1)[:, :k]
+        for i, rows in enumerate(cands):
+            dists[i, rows] = _cosine(q_emb[i:i + 1],
+                                     self._index_matrix[rows],
+                                     self.kernel)[0]
+        return dists
 
     @requests(on='/search')
     def search(self, docs: DocumentArray, parameters: Dict, **kwargs):
         if docs is None:
             return
-        a = docs.embeddings
-        q_emb = _ext_A(_norm(a))
-        # get chunk embeddings and 'min' aggr
-        if self.aggr_chunks == 'none':
-            embedding_matrix = _ext_B(_norm(self._docs.embeddings))
-            dists = _cosine(q_emb, embedding_matrix)
+        if self._dirty or self._index_matrix is None:
+            self._build_index_matrix()
+        if self._index_matrix is None:
+            return
+        q_emb = _norm(docs.embeddings)
+        top_k = int(parameters['top_k'])
+        if self._ann is not None:
+            idx, dist = self._get_ann_top_k(q_emb, top_k)
         else:
-            aggr_chunk_dist = []
-            # assume, it processes just one root query.
-            doc_ids = []
-            for d in self._docs:
-                b = d.chunks.embeddings
-                d_emb = _ext_B(_norm(b))
-                dists = _cosine(q_emb, d_emb) * d.chunks.get_attributes(
-                    'weight')  # cosine distance
+            if self.quantize:
+                dists = self._get_quantized_cosine(q_emb, top_k)
+            else:
+                dists = _cosine(q_emb, self._index_matrix, self.kernel)
+            # get chunk embeddings and 'min' aggr
+            if self.aggr_chunks != 'none':
+                dists = dists * self._chunk_weights  # cosine distance
                 if self.aggr_chunks == 'min':
-                    aggr_chunk_dist.append(dists[:, np.argmin(dists)])
+                    dists = np.minimum.reduceat(dists,
+                                                self._chunk_offsets,
+                                                axis=1)
                 elif self.aggr_chunks == 'avg':
-                    aggr_chunk_dist.append(np.average(dists, axis=1))
+                    dists = np.add.reduceat(dists, self._chunk_offsets,
+                                            axis=1) / self._chunk_counts
                 else:
                     assert False
-                doc_ids.append(d.id)
-            dists = np.stack(aggr_chunk_dist, axis=1)
-        idx, dist = self._get_sorted_top_k(dists, int(parameters['top_k']))
-        ids = np.expand_dims(np.array(doc_ids), 0).repeat(idx.shape[0], axis=0)
-        assert idx.shape[0] == ids.shape[0]
-        for _q, _idx, _ids,  _dists in zip(docs, idx, ids, dist):
-            _ids = _ids[_idx]
-            for _id, _dist in zip(_ids, _dists):
-                d = Document(self._docs[_id], copy=True)
+            idx, dist = self._get_sorted_top_k(dists, top_k)
+        for _q, _idx, _dists in zip(docs, idx, dist):
+            for _id, _dist in zip(self._doc_ids[_idx], _dists):
+                # only the fields used downstream, chunks stay in the index
+                src = self._docs[_id]
+                d = Document(id=src.id,
+                             parent_id=src.parent_id,
+                             text=src.text,
+                             tags=src.tags)
                 d.scores['cosine'] = 1 - _dist  # cosine sim.
                 _q.matches.append(d)
 
     @staticmethod
     def _get_sorted_top_k(dist: 'np.array',
                           top_k: int) -> Tuple['np.ndarray', 'np.ndarray']:
-        if top_k >= dist.shape[1]:
-            idx = dist.argsort(axis=1)[:, :top_k]
-            dist = np.take_along_axis(dist, idx, axis=1)
-        else:
-            idx_ps = dist.argpartition(kth=top_k, axis=1)[:, :top_k]
-            dist = np.take_along_axis(dist, idx_ps, axis=1)
-            idx_fs = dist.argsort(axis=1)
-            idx = np.take_along_axis(idx_ps, idx_fs, axis=1)
-            dist = np.take_along_axis(dist, idx_fs, axis=1)
-
+        k = min(top_k, dist.shape[1])
+        idx_ps = dist.argpartition(kth=k - 1, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, idx_ps, axis=1)
+        idx_fs = dist.argsort(axis=1)
+        idx = np.take_along_axis(idx_ps, idx_fs, axis=1)
+        dist = np.take_along_axis(dist, idx_fs, axis=1)
         return idx, dist
 
 
@@ -236,11 +485,12 @@ class AnnoyFastSearcher(AnnoySearcher):
                 doc.embedding,
                 int(top_k * self.buffer_k),
                 include_distances=True)
-            id_score = {}
-            for idx, dist in zip(indices, dists):
-                idx_id = str(self._ids[idx])
-                p_id = self._docs_flat[idx_id].parent_id if self._docs_flat[
-                    idx_id].parent_id != '' else str(idx)
+            p_ids = []
+            for idx in indices:
+                parent_id = self._docs_flat[str(self._ids[idx])].parent_id
+                p_ids.append(parent_id if parent_id != '' else str(idx))
+            for i in _get_first_per_parent(p_ids, int(top_k)):
+                idx, dist, p_id = indices[i], dists[i], p_ids[i]
                 match = Document(self._docs[p_id], copy=True)
                 match.embedding = self._vecs[idx]
                 if self.is_distance:
@@ -258,11 +508,7 @@ class AnnoyFastSearcher(AnnoySearcher):
                             match.scores[self.metric] = 1 - dist
                     else:
                         match.scores[self.metric] = 1 / (1 + dist)
-                if p_id not in id_score:
-                    id_score[p_id] = True
-                    doc.matches.append(match)
-                    if len(doc.matches) >= top_k:
-                        break
+                doc.matches.append(match)
             if len(doc.matches) < top_k:
                 self.logger.warning("Please increase 'buffer_k'")
 
@@ -295,11 +541,12 @@ class HnswlibFastSearcher(HnswlibSearcher):
             indices, dists = self._indexer.knn_query(doc.embedding,
                                                      k=int(top_k *
                                                            self.buffer_k))
-            id_score = {}
-            for idx, dist in zip(indices[0], dists[0]):
-                idx_id = str(self._ids[int(idx)])
-                p_id = self._docs_flat[idx_id].parent_id if self._docs_flat[
-                    idx_id].parent_id != '' else int(idx)
+            p_ids = []
+            for idx in indices[0]:
+                parent_id = self._docs_flat[str(self._ids[int(idx)])].parent_id
+                p_ids.append(parent_id if parent_id != '' else int(idx))
+            for i in _get_first_per_parent(p_ids, int(top_k)):
+                idx, dist, p_id = indices[0][i], dists[0][i], p_ids[i]
                 match = Document(self._docs[p_id], copy=True)
                 match.embedding = self._vecs[int(idx)]
                 if self.is_distance:
@@ -309,11 +556,7 @@ class HnswlibFastSearcher(HnswlibSearcher):
                         match.scores[self.metric] = 1 - dist
                     else:
                         match.scores[self.metric] = 1 / (1 + dist)
-                if p_id not in id_score:
-                    id_score[p_id] = True
-                    doc.matches.append(match)
-                    if len(doc.matches) >= top_k:
-                        break
+                doc.matches.append(match)
             if len(doc.matches) < top_k:
                 self.logger.warning("Please increase 'buffer_k'")
 
@@ -356,15 +599,15 @@ class FaissFastSearcher(FaissSearcher):
             from faiss import normalize_L2
             normalize_L2(vecs)
         dists, ids = self.index.search(vecs, int(top_k * self.buffer_k))
-        id_score = {}
         if self.metric == 'inner_product':
             dists = 1 - dists
-        for doc_idx, dist in enumerate(zip(ids, dists)):
-            for m_info in zip(*dist):
-                idx, distance = m_info
-                idx_id = str(self._ids[int(idx)])
-                p_id = self._docs_flat[idx_id].parent_id if self._docs_flat[
-                    idx_id].parent_id != '' else int(idx)
+        for doc_idx, (_ids, _dists) in enumerate(zip(ids, dists)):
+            p_ids = []
+            for idx in _ids:
+                parent_id = self._docs_flat[str(self._ids[int(idx)])].parent_id
+                p_ids.append(parent_id if parent_id != '' else int(idx))
+            for i in _get_first_per_parent(p_ids, int(top_k)):
+                idx, distance, p_id = _ids[i], _dists[i], p_ids[i]
                 match = Document(self._docs[p_id], copy=True)
                 match.embedding = self._vecs[int(idx)]
                 if self.is_distance:
@@ -374,12 +617,7 @@ class FaissFastSearcher(FaissSearcher):
                         match.scores[self.metric] = 1 - distance
                     else:
                         match.scores[self.metric] = 1 / (1 + distance)
-
-                if p_id not in id_score:
-                    id_score[p_id] = True
-                    query_docs[doc_idx].matches.append(match)
-                    if len(query_docs[doc_idx].matches) >= top_k:
-                        break
+                query_docs[doc_idx].matches.append(match)
             if len(query_docs[doc_idx].matches) < top_k:
                 self.logger.warning("Please increase 'buffer_k'")
 
@@ -399,35 +637,61 @@ class FilterBy(Executor):
             doc.matches = filtered_matches
 
 
-def _get_ones(x, y):
-    return np.ones((x, y))
-
-
-def _ext_A(A):
-    nA, dim = A.shape
-    A_ext = _get_ones(nA, dim * 3)
-    A_ext[:, dim:2 * dim] = A
-    A_ext[:, 2 * dim:] = A**2
-    return A_ext
-
-
-def _ext_B(B):
-    nB, dim = B.shape
-    B_ext = _get_ones(dim * 3, nB)
-    B_ext[:dim] = (B**2).T
-    B_ext[dim:2 * dim] = -2.0 * B.T
-    del B
-    return B_ext
-
-
-def _euclidean(A_ext, B_ext):
-    sqdist = A_ext.dot(B_ext).clip(min=0)
-    return np.sqrt(sqdist)
+def _get_first_per_parent(parent_ids: List, top_k: int) -> List[int]:
+    # hits are ranked, so the first hit of each parent is its best chunk;
+    # keys keep their type so a root's int position never equals a str id
+    first = {}
+    for i, p_id in enumerate(parent_ids):
+        first.setdefault(p_id, i)
+        if len(first) == top_k:
+            break
+    return list(first.values())[:top_k]
 
 
 def _norm(A):
     return A / np.linalg.norm(A, ord=2, axis=1, keepdims=True)
 
 
-def _cosine(A_norm_ext, B_norm_ext):
-    return A_norm_ext.dot(B_norm_ext).clip(min=0) / 2
+def _quantize(A):
+    # symmetric int8 with one scale per row
+    scale = np.abs(A).max(axis=1, keepdims=True) / 127
+    scale[scale == 0] = 1
+    return np.round(A / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def _dot_int8(A_q, B_q):
+    return np.asarray(simsimd.cdist(A_q, B_q, metric='dot'))
+
+
+_KERNELS = {
+    'simsimd': simsimd is not None,
+    'numba': njit is not None,
+    'numpy': True
+}
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_jit(A_norm, B_norm, out):
+        # parallel over index rows, a single query is the common case
+        for j in prange(B_norm.shape[0]):
+            for i in range(A_norm.shape[0]):
+                acc = 0.0
+                for k in range(A_norm.shape[1]):
+                    acc += A_norm[i, k] * B_norm[j, k]
+                out[i, j] = max(1.0 - acc, 0.0)
+
+
+def _cosine(A_norm, B_norm, kernel='numpy'):
+    # cosine distance of L2-normalized rows
+    if kernel == 'simsimd':
+        dists = simsimd.cdist(np.ascontiguousarray(A_norm, dtype=np.float32),
+                              np.ascontiguousarray(B_norm, dtype=np.float32),
+                              metric='cosine')
+        return np.asarray(dists).clip(min=0)
+    if kernel == 'numba':
+        out = np.empty((A_norm.shape[0], B_norm.shape[0]), dtype=np.float32)
+        _cosine_jit(np.ascontiguousarray(A_norm, dtype=np.float32),
+                    np.ascontiguousarray(B_norm, dtype=np.float32), out)
+        return out
+    return (1 - A_norm.dot(B_norm.T)).clip(min=0)
@@ -21,6 +21,9 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
 # OR OTHER DEALINGS IN THE SOFTWARE.
 
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 
 import pytorch_lightning as pl
@@ -67,16 +70,12 @@ class KoBARTRegression(pl.LightningModule):
 
     def _get_encoding(self, input_ids, attention_mask, typ='norm_avg'):
         if typ == 'norm_avg':
-            outs = self(input_ids, attention_mask)
-            lengths = attention_mask.sum(dim=1)
-            mask_3d = attention_mask.unsqueeze(dim=-1).repeat_interleave(
-                repeats=self.model.config.d_model, dim=2)
-
-            masked_encoder_out = (outs['last_hidden_state'] *
-                                  mask_3d).sum(dim=1)
+            last_hidden = self(input_ids, attention_mask)['last_hidden_state']
+            mask = attention_mask.to(last_hidden.dtype)
+            masked_encoder_out = torch.einsum('bl,bld->bd', mask, last_hidden)
             # to avoid 0 division
-            norm_encoder_out = masked_encoder_out / (lengths +
-                                                     1).unsqueeze(dim=1)
+            norm_encoder_out = masked_encoder_out / (
+                mask.sum(dim=1, keepdim=True) + 1)
             return norm_encoder_out
         elif typ == 'avg':
             last_hidden = self(input_ids, attention_mask)['last_hidden_state']
@@ -89,6 +88,15 @@ class KoBARTRegression(pl.LightningModule):
                                typ=self.hparams.avg_type))
 
 
+class KoBARTEncoder(torch.nn.Module):
+    def __init__(self, model: KoBARTRegression):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.encoding(input_ids, attention_mask)
+
+
 class KoSentenceBART(Executor):
     def __init__(
         self,
@@ -96,7 +104,11 @@ class KoSentenceBART(Executor):
         max_length: int = 128,
         device: str = 'cpu',
         default_traversal_paths: Optional[List[str]] = None,
-        default_batch_size: int = 32,
+        default_batch_size: int = 64,
+        autocast: bool = True,
+        dynamic_quantization: bool = False,
+        cache_size: int = 4096,
+        jit_trace: bool = False,
         *args,
         **kwargs,
     ):
@@ -126,7 +138,82 @@ class KoSentenceBART(Executor):
         self.model = KoBARTRegression.load_from_checkpoint(
             self.pretrained_model_path, hparams={'avg_type': 'norm_avg'})
         self.model.eval()
+        if dynamic_quantization:
+            if device == 'cpu':
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            else:
+                self.logger.warning(
+                    'dynamic_quantization is only supported on cpu, ignored.')
         self.model.to(torch.device(device))
+        self._eager_encoder = KoBARTEncoder(self.model).eval()
+        self.encoder = self._eager_encoder
+        # traced graphs are shape specialized, inputs are padded to max_length
+        self.jit_trace = jit_trace and device == 'cpu'
+        if jit_trace and not self.jit_trace:
+            self.logger.warning('jit_trace is only supported on cpu, ignored.')
+        if self.jit_trace:
+            dummy_ids = torch.zeros(1, self.max_length, dtype=torch.long)
+            dummy_mask = torch.ones_like(dummy_ids)
+            with torch.no_grad():
+                self.encoder = torch.jit.freeze(
+                    torch.jit.trace(self._eager_encoder,
+                                    (dummy_ids, dummy_mask)))
+        # fp16 autocast only pays off (and is only available) on cuda
+        self.autocast = autocast and device == 'cuda'
+        # text -> embedding LRU, tied to the model loaded above
+        self.cache_size = cache_size
+        self._emb_cache = OrderedDict()
+
+    @staticmethod
+    def _get_length_sorted_batches(docs: List, batch_size: int):
+        # batch texts of similar length together to cut padding
+        docs = sorted(docs, key=lambda doc: len(doc.text))
+        for i in range(0, len(docs), batch_size):
+            yield docs[i:i + batch_size]
+
+    def _get_cached(self, key: bytes):
+        embed = self._emb_cache.get(key)
+        if embed is not None:
+            self._emb_cache.move_to_end(key)
+        return embed
+
+    def _put_cached(self, key: bytes, embed):
+        if self.cache_size <= 0:
+            return
+        # own the row, a view would keep its whole batch array alive
+        self._emb_cache[key] = embed.copy()
+        if len(self._emb_cache) > self.cache_size:
+            self._emb_cache.popitem(last=False)
+
+    def _tokenize(self, batch: List):
+        processed_content = []
+        for doc in batch:
+            processed_content.append(self.tokenizer.bos_token + doc.text +
+                                     self.tokenizer.eos_token)
+        input_tensors = self.tokenizer(processed_content,
+                                       return_tensors='pt',
+                                       max_length=self.max_length,
+                                       padding=True)
+        n_pad = self.max_length - input_tensors['input_ids'].shape[1]
+        if self.jit_trace and n_pad > 0:
+            # nothing is truncated, batches longer than max_length are left
+            # as they are and go through the eager encoder instead
+            input_tensors['input_ids'] = torch.nn.functional.pad(
+                input_tensors['input_ids'], (0, n_pad),
+                value=self.tokenizer.pad_token_id)
+            input_tensors['attention_mask'] = torch.nn.functional.pad(
+                input_tensors['attention_mask'], (0, n_pad), value=0)
+        if self.device == 'cuda':
+            # pinned host memory lets the copy overlap with running kernels
+            for key in ('input_ids', 'attention_mask'):
+                input_tensors[key] = input_tensors[key].pin_memory()
+        return input_tensors
+
+    def _to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        if self.device == 'cuda':
+            return tensor.to(self.device, non_blocking=True)
+        return tensor
 
     @requests(on=['/search', '/index', '/update'])
     def encode(self, docs: Optional[DocumentArray], parameters: Dict,
@@ -138,33 +225,50 @@ class KoSentenceBART(Executor):
                `parameters={'traversal_paths': ['r'], 'batch_size': 10}`.
         :param kwargs: Additional key value arguments.
         """
+        batch_size = parameters.get('batch_size', self.default_batch_size)
+        # docs sharing a text are encoded once, e.g. a root and its only chunk
+        misses = {}
         for batch in get_docs_batch_generator(
                 docs,
                 traversal_path=parameters.get('traversal_paths',
                                               self.default_traversal_paths),
-                batch_size=parameters.get('batch_size',
-                                          self.default_batch_size),
+                batch_size=batch_size,
                 needs_attr='text',
         ):
-            texts = batch.get_attributes('text')
-            processed_content = []
-            for cont in texts:
-                processed_content.append(self.tokenizer.bos_token + cont +
-                                         self.tokenizer.eos_token)
-            input_tensors = self.tokenizer(list(processed_content),
-                                           return_tensors='pt',
-                                           max_length=self.max_length,
-                                           padding=True)
-            with torch.no_grad():
-                if self.device == 'cuda':
-                    embedding = self.model.encoding(
-                        input_tensors['input_ids'].cuda(),
-                        input_tensors['attention_mask'].cuda())
-                elif self.device == 'cpu':
-                    embedding = self.model.encoding(
-                        input_tensors['input_ids'],
-                        input_tensors['attention_mask'])
+            for doc in batch:
+                embed = self._get_cached(_text_key(doc.text))
+                if embed is None:
+                    misses.setdefault(doc.text, []).append(doc)
                 else:
-                    assert False
+                    doc.embedding = embed
+        batches = list(
+            self._get_length_sorted_batches(
+                [same_docs[0] for same_docs in misses.values()], batch_size))
+        if not batches:
+            return
+        # tokenize the next batch while the current one is encoded
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(self._tokenize, batches[0])
+            for i, batch in enumerate(batches):
+                input_tensors = future.result()
+                if i + 1 < len(batches):
+                    future = pool.submit(self._tokenize, batches[i + 1])
+                with torch.inference_mode(), torch.cuda.amp.autocast(
+                        enabled=self.autocast):
+                    # the traced encoder only takes max_length inputs
+                    if input_tensors['input_ids'].shape[1] == self.max_length:
+                        encoder = self.encoder
+                    else:
+                        encoder = self._eager_encoder
+                    embedding = encoder(
+                        self._to_device(input_tensors['input_ids']),
+                        self._to_device(input_tensors['attention_mask']))
+                    embedding = embedding.float().cpu().numpy()
                 for doc, embed in zip(batch, embedding):
-                    doc.embedding = embed.cpu().detach().numpy()
+                    for same_doc in misses[doc.text]:
+                        same_doc.embedding = embed
+                    self._put_cached(_text_key(doc.text), embed)
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()